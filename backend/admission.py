@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from graph.request_context import RequestCancelled, RequestContext
+
+
+class Rejected(Exception):
+    """Raised when a request is shed instead of being queued"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def request_timeout(
+    requested: Optional[float], default: float, maximum: float
+) -> float:
+    """
+    Seconds a request may take: what the client asked for, or `default`,
+    capped at `maximum`. Raises ValueError unless `requested` is a finite,
+    positive number, as NaN or infinity would switch the deadline off.
+    """
+    if requested is None:
+        return min(default, maximum)
+    if not math.isfinite(requested) or requested <= 0:
+        raise ValueError("Request timeout must be a finite, positive number")
+    return min(requested, maximum)
+
+
+class AdmissionController:
+    """
+    Bounds how many requests run at once and how many wait for a slot.
+
+    Requests that arrive while every slot is busy are queued in arrival
+    order. A request is shed straight away when the queue is full or when the
+    estimated wait for a slot already exceeds its remaining deadline, so the
+    work is never started for a client that will have given up by then.
+    The wait estimate comes from a moving average of recent service times.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        initial_service_seconds: float = 10.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._in_flight = 0
+        self._queue: deque = deque()
+        self._service_seconds = initial_service_seconds
+        self._stats = {
+            "admitted": 0,
+            "shed_queue_full": 0,
+            "shed_deadline": 0,
+            "expired_in_queue": 0,
+        }
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until the request at `position` in the queue gets a slot"""
+        return math.ceil(position / self.max_in_flight) * self._service_seconds
+
+    def _shed(self, reason: str, retry_after: float) -> Rejected:
+        self._stats[reason] += 1
+        print(f"---ADMISSION: REQUEST SHED ({reason})---")
+        return Rejected(reason, max(1.0, retry_after))
+
+    async def _acquire(self, timeout: Optional[float]) -> None:
+        if self._in_flight < self.max_in_flight and not self._queue:
+            self._in_flight += 1
+            return
+
+        position = len(self._queue) + 1
+        wait = self.estimated_wait(position)
+        if len(self._queue) >= self.max_queue:
+            raise self._shed("shed_queue_full", wait)
+        if timeout is not None and wait > timeout:
+            raise self._shed("shed_deadline", wait)
+
+        slot = asyncio.get_running_loop().create_future()
+        self._queue.append(slot)
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if slot.done():
+                # The slot was handed over just as we gave up
+                self._release()
+            else:
+                slot.cancel()
+                self._queue.remove(slot)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("expired_in_queue", self.estimated_wait(1))
+            raise
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest waiter so nobody can jump in
+        while self._queue:
+            slot = self._queue.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Holds one execution slot for the duration of the block"""
+        await self._acquire(timeout)
+        self._stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._queue),
+            "avg_service_seconds": round(self._service_seconds, 3),
+        }
+
+
+async def run_in_thread(ctx: RequestContext, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs `fn` in a worker thread on behalf of the request `ctx`.
+
+    Threads cannot be cancelled, so when the awaiting task is cancelled the
+    request is marked as cancelled and the thread is waited for until it
+    notices. That keeps the caller's admission slot held for as long as the
+    work is really running.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        ctx.cancel()
+        await asyncio.wait({future})
+        if not future.cancelled():
+            future.exception()
+        raise
+
+
+async def run_until_disconnected(
+    request: Any, work: Awaitable[Any], poll_interval: float = 0.5
+) -> Any:
+    """
+    Awaits `work`, cancelling it if the HTTP client disconnects first.
+
+    Raises RequestCancelled once the work has been cancelled.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                print("---CLIENT DISCONNECTED, CANCELLING REQUEST---")
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, RequestCancelled):
+                    pass
+                raise RequestCancelled("Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
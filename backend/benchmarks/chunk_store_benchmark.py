@@ -0,0 +1,247 @@
+"""
+Memory and latency benchmark for slim Qdrant payloads.
+
+Compares storing chunk text in the Qdrant payload against keeping it in the
+local ChunkStore, with full precision or quantized vectors.
+
+    python benchmarks/chunk_store_benchmark.py --chunks 100000
+    python benchmarks/chunk_store_benchmark.py --chunks 100000 --qdrant-url http://localhost:6333
+
+Without --qdrant-url only the local side is measured, and the Qdrant memory
+is only estimated by multiplying out the vector and payload sizes. With it,
+each of the four layouts is uploaded to a real collection, searched, and the
+memory it adds to the Qdrant process is read from Qdrant's /metrics. Run that
+against a Qdrant instance nothing else is using, as the memory figures are
+process wide.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from chunk_store import ChunkStore  # noqa: E402
+
+DIMENSIONS = 1536
+BATCH_SIZE = 1000
+TOP_K = 4
+
+WORDS = [
+    "equation", "boundary", "laplace", "transform", "integral", "matrix",
+    "eigenvalue", "stress", "strain", "tensor", "fourier", "series",
+    "convergence", "theorem", "definition", "example", "figure", "table",
+    "the", "of", "and", "is", "a", "to", "in", "for", "with", "by", "as",
+] + [f"x_{i}" for i in range(200)]
+
+
+def make_chunk(i, rng):
+    # About 1000 tokens, like the chunks made by process_documents
+    text = " ".join(rng.choice(WORDS) for _ in range(700))
+    metadata = {
+        "file_name": f"coursebook_{i // 500}.pdf",
+        "page": i % 500,
+        "section": f"Chapter {i // 2000}",
+        "parsing_instruction": "Parse university-level engineering coursebooks",
+    }
+    return text, metadata
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:,.1f} MB"
+
+
+def bench_chunk_store(args):
+    rng = random.Random(0)
+    path = os.path.join(tempfile.mkdtemp(), "chunks.db")
+    store = ChunkStore(path)
+
+    text_bytes = full_payload_bytes = slim_payload_bytes = 0
+    started = time.perf_counter()
+    for start in range(0, args.chunks, BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + BATCH_SIZE, args.chunks)):
+            text, metadata = make_chunk(i, rng)
+            text_bytes += len(text.encode("utf-8"))
+            full_payload_bytes += len(json.dumps({"text": text, "metadata": metadata}))
+            slim_payload_bytes += len(json.dumps({"source": metadata["file_name"]}))
+            batch.append((i, text, metadata))
+        store.put_many(batch)
+    write_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(args.lookups):
+        ids = rng.sample(range(args.chunks), TOP_K)
+        started = time.perf_counter()
+        store.get_many(ids)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    print(f"Chunks:                     {args.chunks:,}")
+    print(f"Raw chunk text:             {mb(text_bytes)}")
+    print(f"Chunk store file:           {mb(os.path.getsize(path))}")
+    print(f"Chunk store write:          {write_seconds:.1f}s")
+    print(
+        f"{f'Top-{TOP_K} text fetch:':<28}"
+        f"p50 {statistics.median(latencies):.3f} ms, p99 {percentile(latencies, 0.99):.3f} ms"
+    )
+    print()
+    print("Estimated Qdrant memory, vectors + payloads (arithmetic, not measured):")
+    full_vectors = args.chunks * DIMENSIONS * 4
+    layouts = [
+        ("full payload, float32", full_vectors, full_payload_bytes),
+        ("slim payload, float32", full_vectors, slim_payload_bytes),
+        ("slim payload, int8 in RAM", args.chunks * DIMENSIONS, slim_payload_bytes),
+        ("slim payload, binary in RAM", args.chunks * DIMENSIONS // 8, slim_payload_bytes),
+    ]
+    for name, vectors, payloads in layouts:
+        print(f"  {name:<28} {mb(vectors + payloads)}")
+    store.close()
+
+
+def qdrant_memory(args):
+    """Allocated and resident bytes of the Qdrant process, from /metrics"""
+    import httpx
+
+    api_key = os.getenv("QDRANT_API_KEY")
+    response = httpx.get(
+        f"{args.qdrant_url.rstrip('/')}/metrics",
+        headers={"api-key": api_key} if api_key else {},
+    )
+    response.raise_for_status()
+    memory = {}
+    for line in response.text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in ("memory_allocated_bytes", "memory_resident_bytes"):
+            memory[name] = float(value)
+    return memory
+
+
+def wait_until_indexed(client, name):
+    # Memory is only representative once the optimizers built the segments
+    from qdrant_client.http import models
+
+    while client.get_collection(collection_name=name).status != models.CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def bench_qdrant(args):
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+
+    client = QdrantClient(url=args.qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+    in_ram = models.VectorParams(size=DIMENSIONS, distance=models.Distance.COSINE)
+    on_disk = models.VectorParams(
+        size=DIMENSIONS, distance=models.Distance.COSINE, on_disk=True
+    )
+    layouts = [
+        ("bench_full_float32", in_ram, None, True),
+        ("bench_slim_float32", in_ram, None, False),
+        (
+            "bench_slim_int8",
+            on_disk,
+            models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+                )
+            ),
+            False,
+        ),
+        (
+            "bench_slim_binary",
+            on_disk,
+            models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            ),
+            False,
+        ),
+    ]
+
+    print()
+    print(f"Qdrant at {args.qdrant_url} (memory measured from /metrics):")
+    for name, vectors_config, quantization, full_payload in layouts:
+        rng = random.Random(0)
+        before = qdrant_memory(args)
+        client.recreate_collection(
+            collection_name=name,
+            vectors_config=vectors_config,
+            quantization_config=quantization,
+        )
+        for start in range(0, args.chunks, BATCH_SIZE):
+            points = []
+            for i in range(start, min(start + BATCH_SIZE, args.chunks)):
+                text, metadata = make_chunk(i, rng)
+                payload = (
+                    {"text": text, "metadata": metadata}
+                    if full_payload
+                    else {"source": metadata["file_name"]}
+                )
+                vector = [rng.uniform(-1, 1) for _ in range(DIMENSIONS)]
+                points.append(models.PointStruct(id=i, vector=vector, payload=payload))
+            client.upload_points(collection_name=name, points=points)
+        wait_until_indexed(client, name)
+
+        search_params = (
+            models.SearchParams(
+                quantization=models.QuantizationSearchParams(
+                    rescore=True, oversampling=2.0
+                )
+            )
+            if quantization
+            else None
+        )
+        latencies, response_bytes = [], []
+        for _ in range(args.searches):
+            query = [rng.uniform(-1, 1) for _ in range(DIMENSIONS)]
+            started = time.perf_counter()
+            hits = client.search(
+                collection_name=name,
+                query_vector=query,
+                limit=TOP_K,
+                search_params=search_params,
+                with_payload=full_payload,
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            response_bytes.append(len(json.dumps([hit.model_dump() for hit in hits])))
+        # Measured after searching, so the pages the searches touched count
+        after = qdrant_memory(args)
+        memory = ", ".join(
+            f"{label} +{mb(after[key] - before[key])}"
+            for label, key in (
+                ("allocated", "memory_allocated_bytes"),
+                ("resident", "memory_resident_bytes"),
+            )
+            if key in before and key in after
+        )
+        print(
+            f"  {name:<20} search p50 {statistics.median(latencies):.1f} ms, "
+            f"p99 {percentile(latencies, 0.99):.1f} ms, "
+            f"response {statistics.mean(response_bytes):,.0f} bytes, "
+            f"{memory or 'memory metrics unavailable'}"
+        )
+        client.delete_collection(collection_name=name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--qdrant-url", default=None)
+    args = parser.parse_args()
+
+    bench_chunk_store(args)
+    if args.qdrant_url:
+        bench_qdrant(args)
+
+
+if __name__ == "__main__":
+    main()
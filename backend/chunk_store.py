@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class ChunkStore:
+    """
+    Local, compressed store of chunk text and metadata keyed by Qdrant point id.
+
+    Lets the Qdrant payloads stay small: searches only return point ids and
+    the text of the top hits is read from here. Text and metadata are zlib
+    compressed in a single SQLite file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id INTEGER PRIMARY KEY, text BLOB NOT NULL, metadata BLOB NOT NULL)"
+            )
+
+    def reset(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks")
+
+    @staticmethod
+    def _rows(chunks: Iterable[Tuple[int, str, Dict[str, Any]]]):
+        return (
+            (
+                id,
+                zlib.compress(text.encode("utf-8")),
+                zlib.compress(json.dumps(metadata, default=str).encode("utf-8")),
+            )
+            for id, text, metadata in chunks
+        )
+
+    def put_many(self, chunks: Iterable[Tuple[int, str, Dict[str, Any]]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                self._rows(chunks),
+            )
+
+    def replace_all(self, chunks: Iterable[Tuple[int, str, Dict[str, Any]]]) -> None:
+        """
+        Replaces the whole store with `chunks` in one transaction, so readers
+        never see it empty or half written and a failure keeps the old chunks
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.executemany(
+                "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                self._rows(chunks),
+            )
+
+    def get_many(self, ids: List[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """Returns the text and metadata of every id found in the store"""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})",
+                ids,
+            ).fetchall()
+        return {
+            id: (
+                zlib.decompress(text).decode("utf-8"),
+                json.loads(zlib.decompress(metadata)),
+            )
+            for id, text, metadata in rows
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
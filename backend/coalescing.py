@@ -0,0 +1,114 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different submissions share a key
+
+    Case, surrounding whitespace, repeated whitespace and trailing
+    punctuation are ignored.
+    """
+    question = re.sub(r"\s+", " ", question).strip().casefold()
+    return question.rstrip(" ?!.")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent executions that share the same key.
+
+    The first caller for a key (the leader) runs the work, every caller that
+    arrives while it is still running (a follower) awaits the same result.
+    Followers stop waiting after `follower_timeout` seconds and run the work
+    themselves, so a stuck leader never blocks everyone behind it. When the
+    leader is cancelled, or fails with one of `leader_errors` (errors about
+    the leader's own request such as its deadline), its followers elect a
+    new one instead of sharing the error.
+    """
+
+    def __init__(
+        self,
+        follower_timeout: float = 60.0,
+        leader_errors: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.follower_timeout = follower_timeout
+        self.leader_errors = leader_errors
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self._stats = {
+            "leaders": 0,
+            "coalesced": 0,
+            "follower_fallbacks": 0,
+            "leader_cancellations": 0,
+            "errors": 0,
+        }
+
+    async def run(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        future = self._flights.get(key)
+        if future is None:
+            return await self._lead(key, fn)
+
+        self._count("coalesced")
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future),
+                self.follower_timeout
+                if timeout is None
+                else min(timeout, self.follower_timeout),
+            )
+        except asyncio.TimeoutError:
+            print("---COALESCING: LEADER TIMED OUT, RUNNING INDEPENDENTLY---")
+            self._count("follower_fallbacks")
+            return await fn()
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The leader was cancelled or failed for its own reasons, not
+            # ours, so elect a new leader among the remaining followers
+            print("---COALESCING: LEADER CANCELLED, RETRYING---")
+            self._count("leader_cancellations")
+            return await self.run(key, fn, timeout)
+
+    async def _lead(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        self._count("leaders")
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except self.leader_errors:
+            future.cancel()
+            raise
+        except Exception as e:
+            self._count("errors")
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody is following
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def _count(self, name: str) -> None:
+        self._stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._flights)
+        # Every follower that did not have to run the graph again saved a run
+        stats["executions_saved"] = (
+            stats["coalesced"]
+            - stats["follower_fallbacks"]
+            - stats["leader_cancellations"]
+        )
+        return stats
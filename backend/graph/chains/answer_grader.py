@@ -1,7 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain_core.runnables import RunnableSequence
-from langchain_openai import ChatOpenAI
+from graph.chains.llm import get_llm
 
 
 class GradeAnswer(BaseModel):
@@ -10,7 +10,7 @@ class GradeAnswer(BaseModel):
         description="Answer addresses the question, 'yes' or 'no'"
     )
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm = get_llm("gpt-4o-mini")
 structured_llm_grader = llm.with_structured_output(GradeAnswer)
 
 system = """You are a grader assessing whether an answer addresses / resolves a question.
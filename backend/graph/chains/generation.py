@@ -1,8 +1,8 @@
 from langchain import hub
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from graph.chains.llm import get_llm
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm = get_llm("gpt-4o-mini")
 prompt = hub.pull("rlm/rag-prompt")
 
 generation_chain = prompt | llm | StrOutputParser()
@@ -0,0 +1,107 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_openai import ChatOpenAI
+
+from graph.llm_gateway import LLMGateway, estimate_tokens
+
+# Completion budget assumed when a model has no max_tokens set
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+def _parse_model_limits(value: str) -> Dict[str, int]:
+    # "gpt-4o-mini=16,gpt-3.5-turbo=8"
+    limits = {}
+    for item in filter(None, value.split(",")):
+        model, limit = item.split("=")
+        limits[model.strip()] = int(limit)
+    return limits
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _token_usage(result: ChatResult) -> Optional[int]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+gateway = LLMGateway(
+    requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+    model_concurrency=_parse_model_limits(os.getenv("LLM_MODEL_CONCURRENCY", "")),
+    rate_limit_errors=(openai.RateLimitError,),
+    # APITimeoutError is an APIConnectionError
+    transient_errors=(openai.APIConnectionError, openai.InternalServerError),
+    retry_after=_retry_after,
+    token_usage=_token_usage,
+)
+
+_limits = httpx.Limits(
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32")),
+    max_keepalive_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32")),
+    keepalive_expiry=60,
+)
+# Keep-alive connection pools shared by every OpenAI client in the process
+http_client = httpx.Client(limits=_limits, timeout=60)
+http_async_client = httpx.AsyncClient(limits=_limits, timeout=60)
+
+
+def _estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int]) -> int:
+    prompt = estimate_tokens("".join(str(m.content) for m in messages))
+    return prompt + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class GatewayChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose completions are scheduled and retried by the gateway"""
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        generate = super()._generate
+        return gateway.call(
+            self.model_name,
+            _estimate_tokens(messages, self.max_tokens),
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        agenerate = super()._agenerate
+        return await gateway.acall(
+            self.model_name,
+            _estimate_tokens(messages, self.max_tokens),
+            lambda: agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+
+@lru_cache(maxsize=None)
+def get_llm(model: str, temperature: float = 0) -> ChatOpenAI:
+    """Returns the shared chat model for `model`, going through the gateway"""
+    return GatewayChatOpenAI(
+        model=model,
+        temperature=temperature,
+        # Every retry goes through the gateway so it is scheduled and counted
+        max_retries=0,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
@@ -0,0 +1,18 @@
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from graph.chains.llm import get_llm
+
+llm = get_llm("gpt-4o-mini")
+
+system = """You are a question re-writer for a retrieval system. Given a conversation and a follow-up question, \n 
+    rewrite the follow-up into a standalone question that can be understood without the conversation. \n
+    Resolve references such as "it", "that" or "the second equation" using the conversation. \n
+    If the question is already standalone, return it unchanged. Only return the question."""
+rewrite_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Conversation: \n\n {history} \n\n Follow-up question: {question}"),
+    ]
+)
+
+question_rewriter = rewrite_prompt | llm | StrOutputParser()
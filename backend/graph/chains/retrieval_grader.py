@@ -1,8 +1,8 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from graph.chains.llm import get_llm
 from pydantic import BaseModel, Field
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+llm = get_llm("gpt-4o-mini")
 
 class GradeDocuments(BaseModel):
     """Binary score for relevance check on retrieved documents."""
@@ -2,7 +2,7 @@ from typing import Literal
 
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
+from graph.chains.llm import get_llm
 
 
 class RouteQuery(BaseModel):
@@ -14,7 +14,7 @@ class RouteQuery(BaseModel):
     )
 
 
-llm = ChatOpenAI(temperature=0)
+llm = get_llm("gpt-3.5-turbo")
 structured_llm_router = llm.with_structured_output(RouteQuery)
 
 system = """You are an expert at routing a user question to a vectorstore or web search.
@@ -0,0 +1,17 @@
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from graph.chains.llm import get_llm
+
+llm = get_llm("gpt-4o-mini")
+
+system = """You maintain a running summary of a conversation between a user and an assistant about course material. \n 
+    Extend the current summary with the new turns. Keep the topics, equations, definitions and references \n
+    the user may refer back to, and drop everything else. Keep the summary under 150 words."""
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", system),
+        ("human", "Current summary: \n\n {summary} \n\n New turns: \n\n {turns}"),
+    ]
+)
+
+summarizer = summary_prompt | llm | StrOutputParser()
@@ -0,0 +1,67 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Sources whose results are refreshed, not accumulated, on every web search
+WEB_SOURCES = ("tavily", "wikipedia")
+
+
+class DocumentRecord:
+    """A document known to the current request, referenced by its id"""
+
+    __slots__ = ("id", "source", "score", "text")
+
+    def __init__(self, id: str, source: str, score: Optional[float], text: str):
+        self.id = id
+        self.source = source
+        self.score = score
+        self.text = text
+
+
+def document_id(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class DocumentStore:
+    """
+    Per-request store of every document the graph has seen.
+
+    Documents are keyed by a hash of their content, so the same text is only
+    ever held once however many times it is retrieved or searched for. The
+    graph state only carries ids into this store.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, DocumentRecord] = {}
+
+    def add(self, text: str, source: str, score: Optional[float] = None) -> str:
+        id = document_id(text)
+        record = self._records.get(id)
+        if record is None:
+            self._records[id] = DocumentRecord(id, source, score, text)
+        elif score is not None and (record.score is None or score > record.score):
+            record.score = score
+        return id
+
+    def get(self, id: str) -> DocumentRecord:
+        return self._records[id]
+
+    def texts(self, ids: Iterable[str]) -> List[str]:
+        return [self._records[id].text for id in ids]
+
+    def render(self, ids: Iterable[str]) -> str:
+        """Joins the texts of `ids` for use as prompt context"""
+        return "\n\n".join(self.texts(ids))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+def merge_ids(existing: Optional[Sequence[str]], new: Iterable[str]) -> List[str]:
+    """Returns a new list with `new` appended to `existing`, without duplicates"""
+    merged = list(dict.fromkeys(existing or []))
+    seen = set(merged)
+    for id in new:
+        if id not in seen:
+            seen.add(id)
+            merged.append(id)
+    return merged
@@ -4,6 +4,7 @@ from graph.chains.answer_grader import answer_grader
 from graph.chains.hallucination_grader import hallucination_grader
 from graph.consts import GENERATE, GRADE_DOCUMENTS, RETRIEVE, WEBSEARCH
 from graph.nodes import generate, grade_documents, retrieve
+from graph.request_context import document_store
 from graph.state import GraphState
 from graph.nodes.web_search_subgraph import create_web_search_graph
 
@@ -30,7 +31,7 @@ def grade_generation_grounded_in_documents_and_question(state: GraphState) -> st
     generation = state["generation"]
 
     score = hallucination_grader.invoke(
-        {"documents": documents, "generation": generation}
+        {"documents": document_store().render(documents), "generation": generation}
     )
 
     if hallucination_grade := score.binary_score:
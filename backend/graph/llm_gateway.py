@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from graph.rate_limit import TokenBucket
+from graph.request_context import check_request
+
+
+class Priority(IntEnum):
+    """Lower values are scheduled first"""
+
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.BATCH)
+
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """Runs every LLM call made inside the block with the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token, which is close enough for budgeting
+    return len(text) // 4
+
+
+def _no_retry_after(error: Exception) -> Optional[float]:
+    return None
+
+
+def _no_usage(result: Any) -> Optional[int]:
+    return None
+
+
+class LLMGateway:
+    """
+    Schedules every chat completion made by the chains.
+
+    Calls wait until a slot is free for their model, both the request and the
+    token buckets have capacity and no provider backoff is in effect. Among
+    the waiting calls the one with the best priority (then the oldest) goes
+    first. A rate limit error from the provider pauses all calls, with the
+    pause doubling on consecutive rate limits and halving again after
+    successes. Transient errors (connection failures, timeouts, server
+    errors) only back off the call that hit them.
+
+    The provider specific parts are passed in: the exception types to retry,
+    how to read a Retry-After from a rate limit error and how to read the
+    token usage from a result.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        max_retries: int = 5,
+        rate_limit_errors: Tuple[Type[Exception], ...] = (),
+        transient_errors: Tuple[Type[Exception], ...] = (),
+        retry_after: Callable[[Exception], Optional[float]] = _no_retry_after,
+        token_usage: Callable[[Any], Optional[int]] = _no_usage,
+    ):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.max_retries = max_retries
+        self.rate_limit_errors = rate_limit_errors
+        self.transient_errors = transient_errors
+        self.retry_after = retry_after
+        self.token_usage = token_usage
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self._cond = threading.Condition()
+        self._waiting: List[tuple] = []
+        self._seq = itertools.count()
+        self._active: Dict[str, int] = defaultdict(int)
+        self._backoff = 0.0
+        self._paused_until = 0.0
+        self._stats = {
+            "calls": 0,
+            "rate_limited": 0,
+            "transient_errors": 0,
+            "retries": 0,
+            "queued_seconds": 0.0,
+        }
+
+    def _has_slot(self, model: str) -> bool:
+        limit = self.model_concurrency.get(model, self.max_concurrency)
+        return self._active[model] < limit
+
+    def _wait_time(self, ticket: tuple, tokens: int) -> Optional[float]:
+        # Only the best-priority waiter whose model has a free slot may proceed
+        eligible = [t for t in self._waiting if self._has_slot(t[2])]
+        if not eligible or min(eligible) != ticket:
+            return None
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        return max(self._requests.time_until(1), self._tokens.time_until(tokens))
+
+    def acquire(self, model: str, tokens: int, priority: Priority) -> None:
+        ticket = (priority, next(self._seq), model)
+        started = time.monotonic()
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    # Give up waiting once the request is cancelled or late
+                    check_request()
+                    wait = self._wait_time(ticket, tokens)
+                    if wait == 0:
+                        break
+                    # Bucket refills do not notify, so never sleep for long
+                    self._cond.wait(1.0 if wait is None else min(wait, 1.0))
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            self._requests.try_consume(1)
+            self._tokens.try_consume(tokens)
+            self._active[model] += 1
+            self._stats["calls"] += 1
+            self._stats["queued_seconds"] += time.monotonic() - started
+
+    def release(self, model: str, reserved: int, used: Optional[int]) -> None:
+        with self._cond:
+            self._active[model] -= 1
+            if used is not None:
+                # Correct the reservation with the real usage
+                self._tokens.adjust(reserved - used)
+            self._cond.notify_all()
+
+    def _on_rate_limited(self, retry_after: Optional[float]) -> None:
+        with self._cond:
+            self._backoff = min(max(self._backoff * 2, 1.0), 60.0)
+            pause = max(self._backoff, retry_after or 0.0)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._stats["rate_limited"] += 1
+        print(f"---LLM GATEWAY: RATE LIMITED, PAUSING FOR {pause:.1f}s---")
+
+    def _on_success(self) -> None:
+        with self._cond:
+            self._backoff /= 2
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        """
+        Records a failed attempt and returns how long this call should sleep
+        before retrying. Re-raises the error when it is not retryable or the
+        call is out of retries.
+        """
+        if isinstance(error, self.rate_limit_errors):
+            self._on_rate_limited(self.retry_after(error))
+            delay = 0.0
+        elif isinstance(error, self.transient_errors):
+            with self._cond:
+                self._stats["transient_errors"] += 1
+            # Exponential backoff with full jitter, like the SDK's own retries
+            delay = random.uniform(0, min(0.5 * 2**attempt, 8.0))
+            print(f"---LLM GATEWAY: {type(error).__name__}, RETRYING IN {delay:.1f}s---")
+        else:
+            raise error
+        if attempt == self.max_retries:
+            raise error
+        with self._cond:
+            self._stats["retries"] += 1
+        return delay
+
+    def call(self, model: str, tokens: int, fn: Callable[[], Any]) -> Any:
+        priority = _priority.get()
+        for attempt in range(self.max_retries + 1):
+            self.acquire(model, tokens, priority)
+            used = None
+            try:
+                result = fn()
+                used = self.token_usage(result)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+            else:
+                self._on_success()
+                return result
+            finally:
+                self.release(model, tokens, used)
+            time.sleep(delay)
+
+    async def acall(
+        self, model: str, tokens: int, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        priority = _priority.get()
+        for attempt in range(self.max_retries + 1):
+            await asyncio.to_thread(self.acquire, model, tokens, priority)
+            used = None
+            try:
+                result = await fn()
+                used = self.token_usage(result)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+            else:
+                self._on_success()
+                return result
+            finally:
+                self.release(model, tokens, used)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                "waiting": len(self._waiting),
+                "active": {m: n for m, n in self._active.items() if n},
+                "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            }
@@ -1,13 +1,16 @@
 from typing import Any, Dict
 
 from graph.chains.generation import generation_chain
+from graph.request_context import check_request, document_store
 from graph.state import GraphState
 
 
 def generate(state: GraphState) -> Dict[str, Any]:
     print("---GENERATE---")
+    check_request()
     question = state["question"]
     documents = state["documents"]
 
-    generation = generation_chain.invoke({"context": documents, "question": question})
+    context = document_store().render(documents)
+    generation = generation_chain.invoke({"context": context, "question": question})
     return {"documents": documents, "question": question, "generation": generation}
@@ -1,6 +1,12 @@
 from typing import Any, Dict
 
 from graph.chains.retrieval_grader import retrieval_grader
+from graph.request_context import (
+    GradedRetrieval,
+    check_request,
+    current_request,
+    document_store,
+)
 from graph.state import GraphState
 
 
@@ -19,12 +25,27 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
     print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
     question = state["question"]
     documents = state["documents"]
+    store = document_store()
+    ctx = current_request()
+
+    # A follow-up in the same session that retrieves exactly the chunks of
+    # the previous turn reuses that turn's grades
+    previous = ctx.previous_grading
+    if previous is not None and previous.retrieved == frozenset(documents):
+        print("---SAME DOCUMENTS AS PREVIOUS TURN, REUSING GRADES---")
+        ctx.grading = previous
+        return {
+            "documents": list(previous.relevant),
+            "question": question,
+            "web_search": previous.web_search,
+        }
 
     filtered_docs = []
     web_search = False
     for d in documents:
+        check_request()
         score = retrieval_grader.invoke(
-            {"question": question, "document": d.page_content}
+            {"question": question, "document": store.get(d).text}
         )
         grade = score.binary_score
         if grade.lower() == "yes":
@@ -34,4 +55,7 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
             print("---GRADE: DOCUMENT NOT RELEVANT---")
             web_search = True
             continue
+    ctx.grading = GradedRetrieval(
+        frozenset(documents), tuple(filtered_docs), web_search
+    )
     return {"documents": filtered_docs, "question": question, "web_search": web_search}
\ No newline at end of file
@@ -1,12 +1,21 @@
 from typing import Any, Dict
 
 from graph.state import GraphState
-from ingestion import retriever
+from graph.request_context import check_request, document_store
+from graph.web_prefetch import prefetcher
+from ingestion import retrieve_with_scores
 
 
 def retrieve(state: GraphState) -> Dict[str, Any]:
     print("---RETRIEVE---")
+    check_request()
     question = state["question"]
+    store = document_store()
 
-    documents = retriever(question)
+    documents = [
+        store.add(doc.page_content, "vectorstore", score)
+        for doc, score in retrieve_with_scores(question)
+    ]
+    # Overlap the web search with grading when it is likely to be needed
+    prefetcher.maybe_start(question, [store.get(d).score for d in documents])
     return {"documents": documents, "question": question}
@@ -1,23 +1,18 @@
 from typing import Any, Dict
 
-from langchain.schema import Document
-from langchain_community.tools.tavily_search import TavilySearchResults
-
 from graph.state import GraphState
-
-web_search_tool = TavilySearchResults(k=3)
+from graph.document_store import merge_ids
+from graph.request_context import check_request, document_store
+from graph.web_prefetch import prefetcher
 
 
 def web_search(state: GraphState) -> Dict[str, Any]:
     print("---WEB SEARCH---")
+    check_request()
     question = state["question"]
     documents = state["documents"]
 
-    docs = web_search_tool.invoke({"query": question})
-    web_results = "\n".join([d["content"] for d in docs])
-    web_results = Document(page_content=web_results)
-    if documents is not None:
-        documents.append(web_results)
-    else:
-        documents = [web_results]
+    web_results = prefetcher.search("tavily", question)
+    web_results = document_store().add(web_results, "tavily")
+    documents = merge_ids(documents, [web_results])
     return {"documents": documents, "question": question}
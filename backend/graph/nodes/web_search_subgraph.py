@@ -1,44 +1,43 @@
 import operator
 from typing import Any, Dict, Annotated, List
 from langgraph.graph import StateGraph, START, END
-from langchain.schema import Document
+from graph.document_store import WEB_SOURCES, merge_ids
 from graph.state import GraphState
+from graph.request_context import check_request, document_store
+from graph.web_prefetch import prefetcher
 import time
 
 class WebSearchState(GraphState):
-    tavily_results: Document | None = None
-    wiki_results: Document | None = None
-    documents: List[Document]
+    tavily_results: str | None = None
+    wiki_results: str | None = None
+    documents: List[str]
     question: str
 
 def tavily_search(state: WebSearchState) -> Dict[str, Any]:
     print(f"---STARTING TAVILY SEARCH at {time.strftime('%H:%M:%S')}---")
+    check_request()
     start_time = time.time()
     
-    from langchain_community.tools.tavily_search import TavilySearchResults
-    web_search_tool = TavilySearchResults(k=3)
     question = state["question"]
-    
-    docs = web_search_tool.invoke({"query": question})
-    results = "\n".join([d["content"] for d in docs])
+    results = prefetcher.search("tavily", question)
     
     end_time = time.time()
     print(f"---TAVILY SEARCH COMPLETED at {time.strftime('%H:%M:%S')} (took {end_time - start_time:.2f}s)---")
     
-    return {"tavily_results": Document(page_content=results)}
+    return {"tavily_results": document_store().add(results, "tavily")}
 
 def wikipedia_search(state: WebSearchState) -> Dict[str, Any]:
     print(f"---STARTING WIKIPEDIA SEARCH at {time.strftime('%H:%M:%S')}---")
+    check_request()
     start_time = time.time()
     
-    from graph.chains.wiki_search import wiki_search
     question = state["question"]
-    results = wiki_search(question)
+    results = prefetcher.search("wikipedia", question)
     
     end_time = time.time()
     print(f"---WIKIPEDIA SEARCH COMPLETED at {time.strftime('%H:%M:%S')} (took {end_time - start_time:.2f}s)---")
     
-    return {"wiki_results": Document(page_content=results)}
+    return {"wiki_results": document_store().add(results, "wikipedia")}
 
 def combine_results(state: WebSearchState) -> Dict[str, Any]:
     print(f"---COMBINING SEARCH RESULTS at {time.strftime('%H:%M:%S')}---")
@@ -52,11 +51,11 @@ def combine_results(state: WebSearchState) -> Dict[str, Any]:
     tavily_doc = state["tavily_results"]
     wiki_doc = state["wiki_results"]
     
-    # Add search results to documents
-    if documents:
-        documents.extend([tavily_doc, wiki_doc])
-    else:
-        documents = [tavily_doc, wiki_doc]
+    # Replace the results of any earlier search instead of piling them up, so
+    # retrying after a "not useful" answer keeps the context the same size
+    store = document_store()
+    documents = [d for d in documents or [] if store.get(d).source not in WEB_SOURCES]
+    documents = merge_ids(documents, [tavily_doc, wiki_doc])
     
     print("---RESULTS COMBINED---")
     return {"documents": documents}
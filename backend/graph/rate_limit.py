@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds at most `capacity` tokens and refills at `rate` tokens per second.
+    A request larger than the capacity is treated as a full bucket so it can
+    still go through once the bucket is full.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available, 0 if they are now"""
+        with self._lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self._tokens
+            return max(0.0, missing / self.rate)
+
+    def try_consume(self, amount: float) -> bool:
+        with self._lock:
+            self._refill()
+            amount = min(amount, self.capacity)
+            if self._tokens < amount:
+                return False
+            self._tokens -= amount
+            return True
+
+    def adjust(self, amount: float) -> None:
+        """Gives back (positive) or takes away (negative) tokens after the fact"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+
+from graph.document_store import DocumentStore
+
+
+class RequestCancelled(Exception):
+    """Raised inside the graph once nobody is waiting for the answer anymore"""
+
+
+class DeadlineExceeded(RequestCancelled):
+    """Raised inside the graph once the request ran out of time"""
+
+
+class GradedRetrieval:
+    """
+    Outcome of grading one set of retrieved documents.
+
+    Attributes:
+        retrieved: ids of every retrieved document
+        relevant: ids of the documents graded relevant, in retrieval order
+        web_search: whether grading asked for a web search
+    """
+
+    __slots__ = ("retrieved", "relevant", "web_search")
+
+    def __init__(
+        self, retrieved: FrozenSet[str], relevant: Tuple[str, ...], web_search: bool
+    ):
+        self.retrieved = retrieved
+        self.relevant = relevant
+        self.web_search = web_search
+
+
+class RequestContext:
+    """
+    Per-request data shared by every node of one graph run, kept out of the
+    graph state.
+
+    Attributes:
+        deadline: time.monotonic() value after which the work is useless
+        cancelled: set when the client went away
+        documents: store behind the document ids carried in the graph state
+        prefetched: speculative web searches by source, as (question, future)
+        threads: idents of the threads currently running this request's
+            nodes, only tracked while the request is being profiled
+        previous_grading: grading of an earlier turn of the same session
+        grading: grading done by this request, if any
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self.documents = DocumentStore()
+        self.prefetched = {}
+        self.threads: Optional[Set[int]] = None
+        self.previous_grading: Optional[GradedRetrieval] = None
+        self.grading: Optional[GradedRetrieval] = None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def check(self) -> None:
+        if self.cancelled.is_set():
+            raise RequestCancelled("Request was cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar(
+    "request_context", default=None
+)
+
+
+def current_request() -> Optional[RequestContext]:
+    return _current.get()
+
+
+# Which profiled request each thread is running, so a pool thread that moves
+# on to another request stops being sampled for this one
+_profiled_threads: Dict[int, RequestContext] = {}
+_profiled_lock = threading.Lock()
+
+
+def _track_thread(ctx: RequestContext) -> None:
+    ident = threading.get_ident()
+    owner = _profiled_threads.get(ident)
+    if owner is ctx or (owner is None and ctx.threads is None):
+        return
+    with _profiled_lock:
+        owner = _profiled_threads.pop(ident, None)
+        if owner is not None:
+            owner.threads.discard(ident)
+        if ctx.threads is not None:
+            ctx.threads.add(ident)
+            _profiled_threads[ident] = ctx
+
+
+def _untrack_threads(ctx: RequestContext) -> None:
+    if ctx.threads is None:
+        return
+    with _profiled_lock:
+        for ident in ctx.threads:
+            if _profiled_threads.get(ident) is ctx:
+                del _profiled_threads[ident]
+        ctx.threads.clear()
+
+
+@contextmanager
+def request_scope(ctx: RequestContext):
+    """Makes `ctx` the current request for everything run inside the block"""
+    token = _current.set(ctx)
+    _track_thread(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+        if _current.get() is not ctx:
+            # The request's work is over, later work on its threads is not
+            # part of its profile
+            _untrack_threads(ctx)
+
+
+def invoke_in_scope(graph: Any, inputs: Any, ctx: Optional[RequestContext] = None):
+    """
+    Invokes `graph` inside a request_scope.
+
+    Scripts and tests that have no request of their own get a fresh
+    RequestContext, and with it a document store, for the one run.
+    """
+    with request_scope(ctx if ctx is not None else RequestContext()):
+        return graph.invoke(inputs)
+
+
+def document_store() -> DocumentStore:
+    """Returns the document store of the request the graph is running for"""
+    ctx = _current.get()
+    if ctx is None:
+        # Nodes run in copies of the caller's context, so a store created
+        # here would not be seen by the next node
+        raise RuntimeError(
+            "The graph must be invoked inside a request_scope, "
+            "use invoke_in_scope(graph, inputs)"
+        )
+    return ctx.documents
+
+
+def check_request() -> None:
+    """Stops the current graph run if it was cancelled or is out of time"""
+    ctx = _current.get()
+    if ctx is not None:
+        _track_thread(ctx)
+        ctx.check()
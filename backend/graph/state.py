@@ -9,7 +9,7 @@ class GraphState(TypedDict):
         question: question
         generation: LLM generation
         web_search: whether to add search
-        documents: list of documents
+        documents: ids of documents in the request's document store
     """
 
     question: str
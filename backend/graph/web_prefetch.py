@@ -0,0 +1,160 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
+
+from graph.rate_limit import TokenBucket
+from graph.request_context import (
+    RequestCancelled,
+    RequestContext,
+    check_request,
+    current_request,
+)
+
+
+def _tavily(question: str) -> str:
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    web_search_tool = TavilySearchResults(k=3)
+    docs = web_search_tool.invoke({"query": question})
+    return "\n".join([d["content"] for d in docs])
+
+
+def _wikipedia(question: str) -> str:
+    from graph.chains.wiki_search import wiki_search
+
+    return wiki_search(question)
+
+
+SEARCHES: Dict[str, Callable[[str], str]] = {
+    "tavily": _tavily,
+    "wikipedia": _wikipedia,
+}
+
+
+class WebSearchPrefetcher:
+    """
+    Starts the web searches early when retrieval looks too weak to answer.
+
+    The searches run in the background while the documents are graded. If
+    grading then asks for a web search the prefetched results are used,
+    otherwise they are thrown away when the request ends. Speculative searches are capped per
+    minute so a bad trigger cannot run up the search bill.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        min_score: float,
+        min_results: int,
+        searches_per_minute: int,
+        max_workers: int = 8,
+    ):
+        self.enabled = enabled
+        self.min_score = min_score
+        self.min_results = min_results
+        self._budget = TokenBucket(searches_per_minute, searches_per_minute / 60)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="web-prefetch"
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            "started": 0,
+            "skipped_cost_cap": 0,
+            "hits": 0,
+            "wasted": 0,
+            "failed": 0,
+            "timed_out": 0,
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def is_weak(self, scores: List[Optional[float]]) -> bool:
+        scores = [s for s in scores if s is not None]
+        return (
+            not scores
+            or len(scores) < self.min_results
+            or max(scores) < self.min_score
+        )
+
+    def maybe_start(self, question: str, scores: List[Optional[float]]) -> bool:
+        """Starts the searches for the current request if retrieval looks weak"""
+        ctx = current_request()
+        if not self.enabled or ctx is None or not self.is_weak(scores):
+            return False
+        if not self._budget.try_consume(len(SEARCHES)):
+            self._count("skipped_cost_cap")
+            return False
+
+        print("---WEAK RETRIEVAL: PREFETCHING WEB SEARCH---")
+        for source, search in SEARCHES.items():
+            ctx.prefetched[source] = (question, self._executor.submit(search, question))
+        self._count("started", len(SEARCHES))
+        return True
+
+    def _wait(self, future: Future) -> str:
+        # Wait in short slices so a cancelled request stops waiting promptly
+        while True:
+            try:
+                check_request()
+            except RequestCancelled:
+                future.cancel()
+                self._count("timed_out")
+                raise
+            remaining = current_request().remaining()
+            try:
+                return future.result(
+                    timeout=1.0 if remaining is None else min(remaining, 1.0)
+                )
+            except FutureTimeoutError:
+                continue
+
+    def search(self, source: str, question: str) -> str:
+        """Returns the prefetched results for `source`, or searches now"""
+        ctx = current_request()
+        prefetched = ctx.prefetched.pop(source, None) if ctx is not None else None
+        if prefetched is not None and prefetched[0] == question:
+            try:
+                results = self._wait(prefetched[1])
+                self._count("hits")
+                print(f"---USING PREFETCHED {source.upper()} RESULTS---")
+                return results
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                print(f"Prefetched {source} search failed: {str(e)}")
+                self._count("failed")
+        elif prefetched is not None:
+            # Searched for another question, e.g. a rewritten one
+            prefetched[1].cancel()
+            self._count("wasted")
+        # Never start a search the request has no time left for
+        check_request()
+        return SEARCHES[source](question)
+
+    def discard(self, ctx: RequestContext) -> None:
+        """Drops the prefetched searches `ctx` did not use, at the end of it"""
+        if not ctx.prefetched:
+            return
+        for _, future in ctx.prefetched.values():
+            future.cancel()
+        self._count("wasted", len(ctx.prefetched))
+        ctx.prefetched.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        used = stats["hits"] + stats["wasted"]
+        stats["hit_rate"] = round(stats["hits"] / used, 3) if used else 0.0
+        return stats
+
+
+prefetcher = WebSearchPrefetcher(
+    enabled=os.getenv("SPECULATIVE_WEB_SEARCH", "false").lower() in ("1", "true"),
+    min_score=float(os.getenv("SPECULATE_MIN_SCORE", "0.8")),
+    min_results=int(os.getenv("SPECULATE_MIN_RESULTS", "2")),
+    searches_per_minute=int(os.getenv("SPECULATIVE_SEARCHES_PER_MINUTE", "60")),
+)
@@ -8,6 +8,8 @@ from langchain.schema import Document
 import tiktoken
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from graph.chains.llm import http_client
+from chunk_store import ChunkStore
 
 load_dotenv()
 
@@ -16,6 +18,14 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = "COMPENDAI_COLLECTION"
 
+# Keep chunk text in a local chunk store instead of the Qdrant payloads
+SLIM_PAYLOADS = os.getenv("SLIM_PAYLOADS", "false").lower() in ("1", "true")
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "./chunks.db")
+# "scalar" (int8), "binary" or "none"
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+# How many extra candidates a quantized search rescores with the full vectors
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+
 parsing_instruction = """Parse university-level engineering coursebooks with the following requirements:
 
 Document Structure:
@@ -89,7 +99,41 @@ for file in files:
     except Exception as e:
         print(f"Error processing {file}: {str(e)}")
 
-embeddings = OpenAIEmbeddings()
+embeddings = OpenAIEmbeddings(http_client=http_client)
+chunk_store = ChunkStore(CHUNK_STORE_PATH) if SLIM_PAYLOADS else None
+
+def quantization_config():
+    if VECTOR_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    if VECTOR_QUANTIZATION == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
+
+def search_params():
+    if quantization_config() is None:
+        return None
+    # Search the quantized vectors, then rescore the best candidates with
+    # the full vectors read from disk
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=True,
+            oversampling=QUANTIZATION_OVERSAMPLING
+        )
+    )
+
+def point_payload(text, metadata):
+    if not SLIM_PAYLOADS:
+        return {"text": text, "metadata": metadata}
+    # Only what we may want to filter on; the text lives in the chunk store
+    return {"source": str(metadata.get("file_name", ""))}
 
 def process_documents(file_paths):
     text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
@@ -107,15 +151,27 @@ def process_documents(file_paths):
     metadatas = [doc.metadata for doc in doc_splits]
     embeddings_vectors = embeddings.embed_documents(texts)
     
-    # Create or recreate collection
+    # Create or recreate collection. Quantized vectors are kept in RAM and
+    # the full vectors on disk, where they are only read for rescoring
+    quantization = quantization_config()
     client.recreate_collection(
         collection_name=COLLECTION_NAME,
         vectors_config=models.VectorParams(
             size=len(embeddings_vectors[0]),
-            distance=models.Distance.COSINE
-        )
+            distance=models.Distance.COSINE,
+            on_disk=quantization is not None
+        ),
+        quantization_config=quantization
     )
     
+    if chunk_store is not None:
+        chunk_store.replace_all(zip(range(len(texts)), texts, metadatas))
+        client.create_payload_index(
+            collection_name=COLLECTION_NAME,
+            field_name="source",
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
+    
     # Upload documents with their embeddings
     client.upload_points(
         collection_name=COLLECTION_NAME,
@@ -123,7 +179,7 @@ def process_documents(file_paths):
             models.PointStruct(
                 id=i,
                 vector=embedding,
-                payload={"text": text, "metadata": metadata}
+                payload=point_payload(text, metadata)
             )
             for i, (text, embedding, metadata) in enumerate(zip(texts, embeddings_vectors, metadatas))
         ]
@@ -138,7 +194,7 @@ else:
     client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
 # Create retriever function
-def retrieve_similar(query: str, k: int = 4):
+def retrieve_with_scores(query: str, k: int = 4):
     # Get query embedding
     query_vector = embeddings.embed_query(query)
     
@@ -146,16 +202,40 @@ def retrieve_similar(query: str, k: int = 4):
     results = client.search(
         collection_name=COLLECTION_NAME,
         query_vector=query_vector,
-        limit=k
+        limit=k,
+        search_params=search_params(),
+        # With slim payloads only the ids are needed
+        with_payload=chunk_store is None
     )
     
-    # Return documents
+    if chunk_store is None:
+        chunks = {hit.id: (hit.payload["text"], hit.payload["metadata"]) for hit in results}
+    else:
+        # Fetch the text of the top-k hits only
+        chunks = chunk_store.get_many([hit.id for hit in results])
+        missing = [hit.id for hit in results if hit.id not in chunks]
+        if missing:
+            # The chunk store is out of sync with the collection, e.g. it was
+            # rebuilt by another ingestion; answer from the chunks we have
+            print(
+                f"WARNING: {len(missing)} of {len(results)} hits missing from "
+                f"the chunk store at {chunk_store.path}: {missing}"
+            )
+    
+    # Return documents with their similarity to the query
     return [
-        Document(
-            page_content=hit.payload["text"],
-            metadata=hit.payload["metadata"]
+        (
+            Document(
+                page_content=chunks[hit.id][0],
+                metadata=chunks[hit.id][1]
+            ),
+            hit.score
         )
         for hit in results
+        if hit.id in chunks
     ]
 
+def retrieve_similar(query: str, k: int = 4):
+    return [doc for doc, _ in retrieve_with_scores(query, k)]
+
 retriever = retrieve_similar
\ No newline at end of file
@@ -1,10 +1,44 @@
-from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi import FastAPI, Header, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from typing import Literal, Optional
 from dotenv import load_dotenv
 from graph.graph import app as graph_app
+from graph.chains.llm import gateway
+from graph.llm_gateway import Priority, llm_priority
+from graph.chains.question_rewriter import question_rewriter
+from graph.chains.summarizer import summarizer
+from graph.web_prefetch import prefetcher
+from graph.request_context import (
+    DeadlineExceeded,
+    RequestCancelled,
+    RequestContext,
+    request_scope,
+)
+from coalescing import SingleFlight, normalize_question
+from sessions import SessionStore
+from admission import (
+    AdmissionController,
+    Rejected,
+    request_timeout,
+    run_in_thread,
+    run_until_disconnected,
+)
+from profiling import (
+    DEFAULT_INTERVAL,
+    MAX_PROFILE_SECONDS,
+    PROFILING_ENABLED,
+    collapsed,
+    profile_process,
+    profile_request,
+    speedscope,
+    token_valid,
+    wants_profile,
+)
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+import asyncio
 import traceback
 import uvicorn
 import os
@@ -19,6 +53,35 @@ app = FastAPI()
 # Track processing status of files
 processing_files = {}
 
+# Bumped whenever the document corpus changes so answers computed against an
+# older corpus are never shared with newer requests
+corpus_version = 0
+
+# Identical questions asked at the same time share a single graph execution
+single_flight = SingleFlight(
+    follower_timeout=float(os.getenv("COALESCE_TIMEOUT_SECONDS", "60")),
+    # Cancellation, deadlines and shedding are about the leader's request
+    # only, so followers run the question again rather than fail with it
+    leader_errors=(RequestCancelled, Rejected),
+)
+
+# Bounds concurrent graph executions per worker, shedding what cannot be
+# served before its deadline
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("CHAT_MAX_IN_FLIGHT", "8")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "32")),
+)
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "60"))
+MAX_DEADLINE_SECONDS = float(os.getenv("CHAT_MAX_DEADLINE_SECONDS", "300"))
+
+# Multi-turn chat sessions, kept in memory per worker
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+    history_tokens=int(os.getenv("SESSION_HISTORY_TOKENS", "1000")),
+)
+
 # CORS middleware setup
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +93,11 @@ app.add_middleware(
 
 class QuestionRequest(BaseModel):
     question: str
+    session_id: Optional[str] = None
+
+def bump_corpus_version():
+    global corpus_version
+    corpus_version += 1
 
 # File watcher class
 class DocumentHandler(FileSystemEventHandler):
@@ -47,6 +115,7 @@ class DocumentHandler(FileSystemEventHandler):
                 # Reimport and run ingestion
                 import ingestion
                 importlib.reload(ingestion)
+                bump_corpus_version()
                 print("Ingestion process completed")
                 # Mark file as completed
                 processing_files[filename] = "completed"
@@ -77,25 +146,135 @@ def start_file_watcher():
 watcher_thread = threading.Thread(target=start_file_watcher, daemon=True)
 watcher_thread.start()
 
+def summarize_history(summary, turns):
+    return summarizer.invoke({"summary": summary or "None", "turns": turns})
+
+def summarize_session(session):
+    # Runs after the answer was sent, outside of any request's deadline
+    with llm_priority(Priority.BATCH):
+        sessions.summarize(session, summarize_history)
+
+# Background summaries, referenced until they finish
+summary_tasks = set()
+
+def summarize_in_background(session):
+    task = asyncio.create_task(asyncio.to_thread(summarize_session, session))
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
+
+def run_graph(question, ctx, session):
+    # /chat is user facing, so its LLM calls go ahead of batch work
+    with llm_priority(Priority.INTERACTIVE), request_scope(ctx):
+        try:
+            # Follow-ups are rewritten into standalone questions before retrieval
+            if session.has_history():
+                question = question_rewriter.invoke(
+                    {"history": session.history(), "question": question}
+                )
+                print(f"---REWRITTEN QUESTION: {question}---")
+                ctx.previous_grading = session.grading
+
+            # The grading goes along with the result so requests that shared
+            # this execution can record it in their own sessions
+            return graph_app.invoke({"question": question}), ctx.grading
+        finally:
+            # Whether the graph answered, failed or ran out of time, any
+            # speculative search it did not use was wasted
+            prefetcher.discard(ctx)
+
 @app.options("/chat")
 async def chat_options():
     return {}
 
 @app.post("/chat")
-async def chat(request: QuestionRequest):
+async def chat(
+    request: QuestionRequest,
+    http_request: Request,
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    profile: bool = False,
+    x_profile: Optional[str] = Header(None),
+    x_profiling_token: Optional[str] = Header(None),
+):
+    # The client may say how long it is willing to wait for an answer, up to
+    # the server maximum
+    try:
+        timeout = request_timeout(
+            x_request_timeout, DEFAULT_DEADLINE_SECONDS, MAX_DEADLINE_SECONDS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        # Use your existing graph
-        inputs = {"question": request.question}
+        # Requests without a session id start a new session
+        session = sessions.get(request.session_id)
         response = ""
 
-        # Execute the graph and get the final result
-        result = graph_app.invoke(inputs)
-        
+        ctx = RequestContext(deadline=time.monotonic() + timeout)
+        profiling = wants_profile(profile, x_profile, x_profiling_token)
+
+        async def execute():
+            ctx.check()
+            async with admission.slot(ctx.remaining()):
+                return await run_in_thread(
+                    ctx, run_graph, request.question, ctx, session
+                )
+
+        async def answer():
+            if profiling or session.has_history():
+                # Profiled requests run on their own so the profile is theirs
+                # only, and follow-ups depend on the session history
+                return await execute()
+            # Execute the graph off the event loop, sharing the execution with
+            # any identical first question that is already being answered
+            key = (normalize_question(request.question), corpus_version)
+            return await single_flight.run(key, execute, timeout=ctx.remaining())
+
+        async def turn():
+            # Turns of one session run one at a time, each seeing the last
+            try:
+                async with asyncio.timeout(ctx.remaining()):
+                    async with session.lock:
+                        result, grading = await answer()
+                        needs_summary = sessions.record(
+                            session,
+                            request.question,
+                            (result or {}).get("generation", ""),
+                            grading,
+                        )
+            except TimeoutError:
+                raise DeadlineExceeded("Request deadline exceeded")
+            # Summarizing is a whole LLM round trip, so the answer does not
+            # wait for it and a failed summary never fails the answer
+            if needs_summary:
+                summarize_in_background(session)
+            return result
+
+        if profiling:
+            ctx.threads = set()
+            async with profile_request(ctx.threads.copy) as request_profile:
+                result = await run_until_disconnected(http_request, turn())
+        else:
+            result = await run_until_disconnected(http_request, turn())
+
         # Extract the final generation from the result
         if result and "generation" in result:
             response = result["generation"]
 
-        return {"answer": response}
+        body = {"answer": response, "session_id": session.id}
+        if profiling:
+            body["profile"] = request_profile
+        return body
+    except Rejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Server overloaded ({e.reason})",
+            headers={"Retry-After": str(int(e.retry_after + 0.5))},
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RequestCancelled as e:
+        # The client is gone, so nobody will read this response
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         print(f"Error in /chat endpoint: {str(e)}")
         print("Traceback:")
@@ -147,6 +326,35 @@ async def list_documents():
 async def root():
     return {"status": "ok", "message": "Server is running"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "coalescing": single_flight.stats(),
+        "admission": admission.stats(),
+        "llm": gateway.stats(),
+        "web_prefetch": prefetcher.stats(),
+        "sessions": sessions.stats(),
+    }
+
+@app.get("/admin/profile")
+async def admin_profile(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    x_profiling_token: Optional[str] = Header(None),
+):
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not token_valid(x_profiling_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+    samples = await asyncio.to_thread(profile_process, seconds)
+    if samples is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    if format == "collapsed":
+        return PlainTextResponse(collapsed(samples))
+    return speedscope(samples, "process", DEFAULT_INTERVAL)
+
 @app.get("/test")
 async def test():
     return {"status": "ok", "message": "Backend is reachable"}
@@ -170,6 +378,7 @@ async def delete_document(filename: str):
         file_path = f"./data/{filename}"
         if os.path.exists(file_path):
             os.remove(file_path)
+            bump_corpus_version()
             # Remove from processing status if it exists
             if filename in processing_files:
                 del processing_files[filename]
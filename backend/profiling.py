@@ -0,0 +1,227 @@
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Profiling is opt-in; when disabled none of this code runs on the hot path
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+DEFAULT_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60
+
+Stack = Tuple[str, ...]
+
+
+def token_valid(token: Optional[str]) -> bool:
+    """
+    Whether `token` may profile. Profiles expose stacks and allocation
+    sites, so profiling needs PROFILING_TOKEN to be set.
+    """
+    return bool(PROFILING_TOKEN and token) and hmac.compare_digest(
+        token.encode("utf-8"), PROFILING_TOKEN.encode("utf-8")
+    )
+
+
+def wants_profile(profile: bool, header: Optional[str], token: Optional[str]) -> bool:
+    """
+    Whether a request asked to be profiled, with a valid token, while
+    profiling is enabled. Requests without the token are served normally.
+    """
+    return (
+        PROFILING_ENABLED
+        and (profile or header in ("1", "true"))
+        and token_valid(token)
+    )
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> Stack:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+class StackSampler:
+    """
+    Samples Python stacks from a background thread.
+
+    Every `interval` seconds the current stack of each sampled thread is
+    recorded, so the counts approximate where wall-clock time is spent,
+    I/O waits included. `threads` returns the thread idents to sample; all
+    threads are sampled when it is not given.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_INTERVAL,
+        threads: Optional[Callable[[], Iterable[int]]] = None,
+    ):
+        self.interval = interval
+        self.threads = threads
+        self.samples: Counter = Counter()
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            wanted = set(self.threads()) if self.threads else None
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (wanted is not None and ident not in wanted):
+                    continue
+                self.samples[_stack(frame)] += 1
+
+    def start(self) -> "StackSampler":
+        self.started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self.started
+        return self.samples
+
+
+def collapsed(samples: Counter) -> str:
+    """Renders samples in the collapsed format used by flamegraph tools"""
+    return "\n".join(
+        f"{';'.join(stack)} {count}" for stack, count in samples.most_common()
+    )
+
+
+def speedscope(samples: Counter, name: str, interval: float) -> Dict[str, Any]:
+    """Renders samples as a speedscope sampled profile"""
+    frames: List[Dict[str, Any]] = []
+    index: Dict[str, int] = {}
+    stacks, weights = [], []
+    for stack, count in samples.items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            ids.append(index[frame])
+        stacks.append(ids)
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": stacks,
+                "weights": weights,
+            }
+        ],
+        "name": name,
+    }
+
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+@contextmanager
+def _tracing():
+    # tracemalloc is process wide, so keep it on while any profile needs it,
+    # and never stop it if something else (e.g. PYTHONTRACEMALLOC) started it
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+    try:
+        yield
+    finally:
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and _tracemalloc_started:
+                tracemalloc.stop()
+                _tracemalloc_started = False
+
+
+def allocation_summary(
+    before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int = 20
+) -> List[Dict[str, Any]]:
+    stats = after.compare_to(before, "lineno")
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+        }
+        for stat in stats[:limit]
+    ]
+
+
+@asynccontextmanager
+async def profile_request(threads: Callable[[], Iterable[int]]):
+    """
+    Profiles one request while the block runs.
+
+    Samples the threads returned by `threads` and records the allocations
+    made meanwhile. Allocations from other requests running at the same time
+    are included as tracemalloc cannot tell them apart. The yielded dict is
+    filled in when the block exits. Snapshots walk every traced allocation,
+    so they are taken off the event loop.
+    """
+    profile: Dict[str, Any] = {}
+    with _tracing():
+        before = await asyncio.to_thread(tracemalloc.take_snapshot)
+        sampler = StackSampler(threads=threads).start()
+        try:
+            yield profile
+        finally:
+            samples = sampler.stop()
+            after = await asyncio.to_thread(tracemalloc.take_snapshot)
+            allocations = await asyncio.to_thread(allocation_summary, before, after)
+            profile.update(
+                {
+                    "duration_seconds": round(sampler.duration, 3),
+                    "samples": sum(samples.values()),
+                    "interval_seconds": sampler.interval,
+                    "collapsed": collapsed(samples),
+                    "allocations": allocations,
+                }
+            )
+
+
+_process_profile_lock = threading.Lock()
+
+
+def profile_process(seconds: float, interval: float = DEFAULT_INTERVAL) -> Optional[Counter]:
+    """
+    Samples every thread in the process for `seconds`.
+
+    Returns None when another process profile is already running.
+    """
+    if not _process_profile_lock.acquire(blocking=False):
+        return None
+    try:
+        sampler = StackSampler(interval=interval).start()
+        time.sleep(min(seconds, MAX_PROFILE_SECONDS))
+        return sampler.stop()
+    finally:
+        _process_profile_lock.release()
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from graph.llm_gateway import estimate_tokens
+from graph.request_context import GradedRetrieval
+
+
+class Session:
+    """
+    Conversation state of one chat session.
+
+    Attributes:
+        summary: rolling summary of the turns that no longer fit the budget
+        turns: most recent (question, answer) pairs, oldest first
+        grading: documents graded for the previous turn, reused when a
+            follow-up retrieves the same chunks
+        lock: serializes the turns of the session
+        summarizing: whether a summary of the session is being made
+
+    `summary` and `turns` are replaced, never changed in place, so they can
+    be read without holding the store's lock.
+    """
+
+    def __init__(self, id: str):
+        self.id = id
+        self.summary = ""
+        self.turns: Deque[Tuple[str, str]] = deque()
+        self.grading: Optional[GradedRetrieval] = None
+        self.lock = asyncio.Lock()
+        self.summarizing = False
+        self.last_used = time.monotonic()
+
+    def has_history(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def history(self) -> str:
+        # Read the turns first: a summary replaces the summary, then the
+        # turns, so this may repeat a turn but never lose one
+        turns = self.turns
+        summary = self.summary
+        lines = []
+        if summary:
+            lines.append(f"Summary of earlier conversation: {summary}")
+        for question, answer in turns:
+            lines.append(f"User: {question}")
+            lines.append(f"Assistant: {answer}")
+        return "\n".join(lines)
+
+    def size_bytes(self) -> int:
+        size = len(self.summary) + sum(len(q) + len(a) for q, a in self.turns)
+        if self.grading is not None:
+            # Document ids are 16 hex characters
+            size += 16 * len(self.grading.retrieved)
+        return size
+
+
+class SessionStore:
+    """
+    Bounded in-memory store of chat sessions for this worker.
+
+    Sessions unused for `ttl_seconds` expire. When there are more than
+    `max_sessions` sessions or they hold more than `max_bytes` of text, the
+    least recently used ones are evicted. Each session's history is kept
+    under `history_tokens` by folding its oldest turns into a summary, which
+    the caller makes off the response path with `summarize`.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        ttl_seconds: float,
+        max_bytes: int,
+        history_tokens: int,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.history_tokens = history_tokens
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0,
+            "expired": 0,
+            "evicted": 0,
+            "summarized": 0,
+            "summarize_failed": 0,
+        }
+
+    def get(self, session_id: Optional[str]) -> Session:
+        """
+        Returns the session, creating it if it is unknown or expired. A new
+        session with a random id is created when no id is given.
+        """
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+                self._stats["created"] += 1
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            self._evict()
+            return session
+
+    def record(
+        self,
+        session: Session,
+        question: str,
+        answer: str,
+        grading: Optional[GradedRetrieval],
+    ) -> bool:
+        """
+        Adds a finished turn to the session.
+
+        Returns whether the history is now over its token budget, in which
+        case `summarize` should be called for the session.
+        """
+        with self._lock:
+            session.turns = deque([*session.turns, (question, answer)])
+            session.grading = grading
+            session.last_used = time.monotonic()
+            if session.id in self._sessions:
+                self._sessions.move_to_end(session.id)
+            self._evict()
+            return self._over_budget(session)
+
+    def _over_budget(self, session: Session) -> bool:
+        history = "\n".join([session.summary] + [q + a for q, a in session.turns])
+        return len(session.turns) > 1 and estimate_tokens(history) > self.history_tokens
+
+    def summarize(self, session: Session, summarize: Callable[[str, str], str]) -> None:
+        """
+        Folds every turn but the latest into the session's summary.
+
+        `summarize(summary, turns)` is slow, so it runs without holding the
+        lock and turns recorded meanwhile are kept. When it fails the error
+        is logged and the turns stay as they are, to be summarized after
+        the next turn.
+        """
+        with self._lock:
+            if session.summarizing or not self._over_budget(session):
+                return
+            session.summarizing = True
+            summary = session.summary
+            folded = list(session.turns)[:-1]
+
+        try:
+            summary = summarize(
+                summary,
+                "\n".join(f"User: {q}\nAssistant: {a}" for q, a in folded),
+            )
+        except Exception as e:
+            print(f"Error summarizing session {session.id}: {str(e)}")
+            with self._lock:
+                session.summarizing = False
+                self._stats["summarize_failed"] += 1
+            return
+
+        with self._lock:
+            session.summarizing = False
+            # Only this method removes turns, so the folded ones are still
+            # the oldest
+            session.summary = summary
+            session.turns = deque(list(session.turns)[len(folded):])
+            self._stats["summarized"] += 1
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self._stats["expired"] += 1
+
+    def _evict(self) -> None:
+        total = sum(s.size_bytes() for s in self._sessions.values())
+        # Never evict the most recently used session, it is being served
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or total > self.max_bytes
+        ):
+            _, session = self._sessions.popitem(last=False)
+            total -= session.size_bytes()
+            self._stats["evicted"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "sessions": len(self._sessions),
+                "bytes": sum(s.size_bytes() for s in self._sessions.values()),
+            }
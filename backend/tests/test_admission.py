@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Rejected, request_timeout
+
+
+def test_requests_queue_behind_busy_slots() -> None:
+    order = []
+
+    async def work(controller, name):
+        async with controller.slot(timeout=5):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        controller = AdmissionController(
+            max_in_flight=1, max_queue=5, initial_service_seconds=0.01
+        )
+        await asyncio.gather(*[work(controller, i) for i in range(3)])
+        return controller.stats()
+
+    stats = asyncio.run(main())
+    assert order == [0, 1, 2]
+    assert stats["admitted"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_sheds_when_wait_exceeds_deadline() -> None:
+    async def main():
+        controller = AdmissionController(
+            max_in_flight=1, max_queue=5, initial_service_seconds=10
+        )
+        async with controller.slot():
+            with pytest.raises(Rejected) as e:
+                async with controller.slot(timeout=1):
+                    pass
+        return e.value, controller.stats()
+
+    rejected, stats = asyncio.run(main())
+    assert rejected.reason == "shed_deadline"
+    assert rejected.retry_after >= 10
+    assert stats["shed_deadline"] == 1
+
+
+def test_sheds_when_queue_is_full() -> None:
+    async def main():
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        async with controller.slot():
+            with pytest.raises(Rejected) as e:
+                async with controller.slot():
+                    pass
+        return e.value
+
+    assert asyncio.run(main()).reason == "shed_queue_full"
+
+
+def test_request_timeout_is_capped_and_validated() -> None:
+    assert request_timeout(None, 60, 300) == 60
+    assert request_timeout(5, 60, 300) == 5
+    assert request_timeout(1000, 60, 300) == 300
+
+    # NaN and infinity would disable the deadline, the rest makes no sense
+    for value in (float("nan"), float("inf"), -1, 0):
+        with pytest.raises(ValueError):
+            request_timeout(value, 60, 300)
@@ -0,0 +1,37 @@
+import pytest
+
+from chunk_store import ChunkStore
+
+
+def test_round_trips_text_and_metadata(tmp_path) -> None:
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    store.put_many([(0, "first chunk", {"page": 1}), (1, "second chunk", {})])
+
+    chunks = store.get_many([1, 0, 7])
+
+    assert chunks == {0: ("first chunk", {"page": 1}), 1: ("second chunk", {})}
+
+
+def test_reset_removes_every_chunk(tmp_path) -> None:
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    store.put_many([(0, "chunk", {})])
+
+    store.reset()
+
+    assert len(store) == 0
+
+
+def test_replace_all_is_atomic(tmp_path) -> None:
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    store.put_many([(0, "old chunk", {})])
+
+    def chunks():
+        yield 0, "new chunk", {}
+        raise RuntimeError("embedding failed")
+
+    with pytest.raises(RuntimeError):
+        store.replace_all(chunks())
+    assert store.get_many([0]) == {0: ("old chunk", {})}
+
+    store.replace_all([(1, "new chunk", {})])
+    assert store.get_many([0, 1]) == {1: ("new chunk", {})}
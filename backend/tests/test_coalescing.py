@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from coalescing import SingleFlight, normalize_question
+from graph.request_context import DeadlineExceeded, RequestCancelled, RequestContext
+
+
+def test_normalize_question() -> None:
+    assert normalize_question("  What is  Agent memory? ") == "what is agent memory"
+    assert normalize_question("what is agent memory") == "what is agent memory"
+
+
+def test_concurrent_requests_share_one_execution() -> None:
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.run("key", work) for _ in range(5)])
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["answer"] * 5
+    assert calls == 1
+    assert flight.stats()["executions_saved"] == 4
+
+
+def test_follower_runs_independently_after_timeout() -> None:
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2 if calls == 1 else 0)
+        return calls
+
+    async def main():
+        flight = SingleFlight(follower_timeout=0.01)
+        leader = asyncio.create_task(flight.run("key", work))
+        await asyncio.sleep(0)
+        follower = await flight.run("key", work)
+        return flight, await leader, follower
+
+    flight, leader, follower = asyncio.run(main())
+    assert calls == 2
+    assert flight.stats()["follower_fallbacks"] == 1
+
+
+def test_leader_deadline_is_not_shared_with_followers() -> None:
+    calls = 0
+
+    async def work(ctx):
+        nonlocal calls
+        calls += 1
+        for _ in range(10):
+            ctx.check()
+            await asyncio.sleep(0.01)
+        return "answer"
+
+    async def ask(flight, deadline):
+        ctx = RequestContext(deadline=time.monotonic() + deadline)
+        return await flight.run("key", lambda: work(ctx), timeout=ctx.remaining())
+
+    async def main():
+        flight = SingleFlight(leader_errors=(RequestCancelled,))
+        leader = asyncio.create_task(ask(flight, 0.03))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(ask(flight, 5))
+        results = await asyncio.gather(leader, follower, return_exceptions=True)
+        return flight, results
+
+    flight, (leader, follower) = asyncio.run(main())
+    assert isinstance(leader, DeadlineExceeded)
+    # The follower re-ran the question under its own, longer deadline
+    assert follower == "answer"
+    assert calls == 2
+    assert flight.stats()["leader_cancellations"] == 1
+    assert flight.stats()["errors"] == 0
@@ -0,0 +1,46 @@
+import pytest
+
+from graph.document_store import DocumentStore, document_id, merge_ids
+from graph.request_context import RequestContext, document_store, invoke_in_scope
+
+
+def test_same_text_is_stored_once() -> None:
+    store = DocumentStore()
+    first = store.add("agent memory", "vectorstore", 0.5)
+    second = store.add("agent memory", "tavily", 0.8)
+
+    assert first == second
+    assert len(store) == 1
+    assert store.get(first).source == "vectorstore"
+    assert store.get(first).score == 0.8
+
+
+def test_merge_ids_does_not_mutate_or_duplicate() -> None:
+    existing = ["a", "b"]
+    merged = merge_ids(existing, ["b", "c", "c"])
+
+    assert merged == ["a", "b", "c"]
+    assert existing == ["a", "b"]
+
+
+def test_render_joins_texts_in_order() -> None:
+    store = DocumentStore()
+    ids = [store.add("first", "vectorstore"), store.add("second", "wikipedia")]
+
+    assert store.render(ids) == "first\n\nsecond"
+
+
+def test_graph_invoked_without_a_request_gets_its_own_store() -> None:
+    class Graph:
+        def invoke(self, inputs):
+            return {"documents": [document_store().add(inputs["question"], "vectorstore")]}
+
+    with pytest.raises(RuntimeError):
+        Graph().invoke({"question": "agent memory"})
+
+    result = invoke_in_scope(Graph(), {"question": "agent memory"})
+    assert result["documents"] == [document_id("agent memory")]
+
+    ctx = RequestContext()
+    invoke_in_scope(Graph(), {"question": "agent memory"}, ctx)
+    assert ctx.documents.texts(result["documents"]) == ["agent memory"]
@@ -0,0 +1,79 @@
+import importlib
+import os
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langgraph")
+from langchain_core.documents import Document  # noqa: E402
+
+from graph.request_context import RequestContext, request_scope  # noqa: E402
+
+CHUNKS = [("relevant chunk", 0.9), ("off topic chunk", 0.4)]
+
+
+class Grader:
+    def invoke(self, inputs):
+        relevant = inputs["document"].startswith("relevant")
+        return SimpleNamespace(binary_score="yes" if relevant else "no")
+
+
+@pytest.fixture
+def nodes(monkeypatch):
+    # The chains only need a key to be built, nothing here calls OpenAI
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", "test"))
+    # ingestion parses ./data and connects to Qdrant when imported
+    ingestion = types.ModuleType("ingestion")
+    ingestion.retrieve_with_scores = None
+    monkeypatch.setitem(sys.modules, "ingestion", ingestion)
+
+    retrieve = importlib.import_module("graph.nodes.retrieve")
+    grade = importlib.import_module("graph.nodes.grade_documents")
+    web = importlib.import_module("graph.nodes.web_search_subgraph")
+    monkeypatch.setattr(
+        retrieve,
+        "retrieve_with_scores",
+        lambda question: [(Document(page_content=t), s) for t, s in CHUNKS],
+    )
+    monkeypatch.setattr(grade, "retrieval_grader", Grader())
+    searches = {"round": 1}
+    monkeypatch.setattr(
+        web.prefetcher,
+        "search",
+        lambda source, question: f"{source} result {searches['round']}",
+    )
+    return retrieve, grade, web, searches
+
+
+def test_documents_flow_through_the_graph_as_ids(nodes) -> None:
+    retrieve, grade, web, searches = nodes
+    question = {"question": "agent memory"}
+
+    with request_scope(RequestContext()) as ctx:
+        state = retrieve.retrieve(question)
+        assert len(state["documents"]) == 2
+        assert ctx.documents.texts(state["documents"]) == [t for t, _ in CHUNKS]
+
+        state.update(grade.grade_documents(state))
+        assert state["web_search"] is True
+        assert ctx.documents.texts(state["documents"]) == ["relevant chunk"]
+
+        for _ in range(2):
+            state.update(web.tavily_search(question))
+            state.update(web.wikipedia_search(question))
+            state.update(web.combine_results(state))
+            searches["round"] += 1
+
+    # The second search replaced the results of the first one
+    assert ctx.documents.texts(state["documents"]) == [
+        "relevant chunk",
+        "tavily result 2",
+        "wikipedia result 2",
+    ]
+    assert [ctx.documents.get(d).source for d in state["documents"]] == [
+        "vectorstore",
+        "tavily",
+        "wikipedia",
+    ]
@@ -0,0 +1,170 @@
+import threading
+import time
+
+import pytest
+
+from graph.llm_gateway import LLMGateway, Priority, llm_priority
+from graph.rate_limit import TokenBucket
+
+
+class FakeRateLimit(Exception):
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after
+
+
+class FakeConnectionError(Exception):
+    pass
+
+
+def test_token_bucket_refills_over_time() -> None:
+    bucket = TokenBucket(capacity=10, rate=100)
+    assert bucket.try_consume(10)
+    assert not bucket.try_consume(5)
+    assert bucket.time_until(5) == pytest.approx(0.05, abs=0.01)
+    time.sleep(0.06)
+    assert bucket.try_consume(5)
+
+
+def test_token_bucket_caps_requests_and_refunds() -> None:
+    bucket = TokenBucket(capacity=10, rate=1)
+    # Larger than the capacity counts as a full bucket
+    assert bucket.time_until(50) == 0
+    assert bucket.try_consume(50)
+    assert bucket.time_until(10) > 9
+    bucket.adjust(4)
+    assert bucket.try_consume(4)
+
+
+def test_best_priority_goes_first() -> None:
+    gateway = LLMGateway(
+        requests_per_minute=6000, tokens_per_minute=1_000_000, max_concurrency=4
+    )
+    interactive = (Priority.INTERACTIVE, 5, "model")
+    batch = (Priority.BATCH, 1, "model")
+    gateway._waiting = [batch, interactive]
+
+    assert gateway._wait_time(interactive, 10) == 0
+    # The older batch call still waits for the interactive one
+    assert gateway._wait_time(batch, 10) is None
+
+
+def test_waiter_for_a_full_model_does_not_block_others() -> None:
+    gateway = LLMGateway(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        model_concurrency={"busy": 1},
+    )
+    gateway._active["busy"] = 1
+    busy = (Priority.INTERACTIVE, 1, "busy")
+    free = (Priority.BATCH, 2, "free")
+    gateway._waiting = [busy, free]
+
+    assert gateway._wait_time(free, 10) == 0
+    assert gateway._wait_time(busy, 10) is None
+
+
+def test_per_model_concurrency_cap() -> None:
+    gateway = LLMGateway(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        model_concurrency={"small": 1},
+    )
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return "ok"
+
+    threads = [
+        threading.Thread(target=gateway.call, args=("small", 10, work))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == 1
+    assert gateway.stats()["calls"] == 4
+    assert gateway.stats()["active"] == {}
+
+
+def test_rate_limit_pauses_every_call() -> None:
+    gateway = LLMGateway(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        rate_limit_errors=(FakeRateLimit,),
+        retry_after=lambda e: e.retry_after,
+    )
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FakeRateLimit(retry_after=0.2)
+        return "ok"
+
+    with llm_priority(Priority.INTERACTIVE):
+        assert gateway.call("model", 10, flaky) == "ok"
+
+    # The first 429 backs off for at least a second, more than Retry-After
+    assert attempts[1] - attempts[0] >= 1.0
+    stats = gateway.stats()
+    assert stats["rate_limited"] == 1
+    assert stats["retries"] == 1
+
+
+def test_transient_errors_are_retried() -> None:
+    gateway = LLMGateway(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        transient_errors=(FakeConnectionError,),
+    )
+    attempts = 0
+
+    def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise FakeConnectionError()
+        return "ok"
+
+    assert gateway.call("model", 10, flaky) == "ok"
+    stats = gateway.stats()
+    assert stats["transient_errors"] == 2
+    assert stats["rate_limited"] == 0
+    assert stats["paused_for"] == 0
+
+
+def test_other_errors_and_exhausted_retries_raise() -> None:
+    gateway = LLMGateway(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        max_retries=1,
+        transient_errors=(FakeConnectionError,),
+    )
+
+    def broken():
+        raise ValueError("bad request")
+
+    def down():
+        raise FakeConnectionError()
+
+    with pytest.raises(ValueError):
+        gateway.call("model", 10, broken)
+    with pytest.raises(FakeConnectionError):
+        gateway.call("model", 10, down)
+    assert gateway.stats()["retries"] == 1
+    assert gateway.stats()["active"] == {}
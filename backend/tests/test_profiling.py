@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import profiling
+from graph.request_context import RequestContext, check_request, request_scope
+from profiling import collapsed, profile_request, speedscope, token_valid, wants_profile
+
+SAMPLES = Counter(
+    {
+        ("main (app.py:1)", "chat (main.py:10)", "invoke (graph.py:5)"): 3,
+        ("main (app.py:1)", "idle (app.py:20)"): 1,
+    }
+)
+
+
+def test_collapsed_output() -> None:
+    assert collapsed(SAMPLES).splitlines() == [
+        "main (app.py:1);chat (main.py:10);invoke (graph.py:5) 3",
+        "main (app.py:1);idle (app.py:20) 1",
+    ]
+
+
+def test_speedscope_output() -> None:
+    profile = speedscope(SAMPLES, "request", 0.005)
+    frames = [f["name"] for f in profile["shared"]["frames"]]
+    sampled = profile["profiles"][0]
+
+    # Shared frames are listed once however many stacks contain them
+    assert frames.count("main (app.py:1)") == 1
+    assert len(frames) == 4
+    stacks = [[frames[i] for i in stack] for stack in sampled["samples"]]
+    assert list(map(tuple, stacks)) == list(SAMPLES)
+    assert sampled["weights"] == [0.015, 0.005]
+    assert sampled["endValue"] == 0.02
+
+
+def test_profiling_is_off_unless_enabled(monkeypatch) -> None:
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    assert not wants_profile(True, "1", "secret")
+
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    assert wants_profile(True, None, "secret")
+    assert wants_profile(False, "true", "secret")
+    assert not wants_profile(False, None, "secret")
+    assert not wants_profile(False, "0", "secret")
+
+
+def test_profiling_flag_is_ignored_without_the_token(monkeypatch) -> None:
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    assert not wants_profile(True, "1", None)
+    assert not wants_profile(True, "1", "guess")
+
+
+def test_token_is_required(monkeypatch) -> None:
+    # Without a configured token nobody may profile
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", None)
+    assert not token_valid(None)
+    assert not token_valid("anything")
+
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    assert token_valid("secret")
+    assert not token_valid(None)
+    assert not token_valid("")
+    assert not token_valid("guess")
+
+
+def test_request_profile_samples_its_threads() -> None:
+    threads = set()
+
+    def work():
+        threads.add(threading.get_ident())
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            sum(range(1000))
+
+    async def main():
+        async with profile_request(threads.copy) as profile:
+            await asyncio.to_thread(work)
+        return profile
+
+    was_tracing = tracemalloc.is_tracing()
+    profile = asyncio.run(main())
+    assert profile["samples"] > 0
+    assert "work (test_profiling.py" in profile["collapsed"]
+    assert isinstance(profile["allocations"], list)
+    assert tracemalloc.is_tracing() == was_tracing
+
+
+def test_tracemalloc_started_elsewhere_is_left_running() -> None:
+    tracemalloc.start()
+    try:
+
+        async def main():
+            async with profile_request(set):
+                pass
+
+        asyncio.run(main())
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_threads_leave_a_profile_when_they_move_on() -> None:
+    profiled = RequestContext()
+    profiled.threads = set()
+    seen = {}
+
+    def node():
+        # A pool thread runs a node of the profiled request, then one of
+        # another request
+        check_request()
+        seen["during"] = set(profiled.threads)
+        with request_scope(RequestContext()):
+            check_request()
+        seen["after"] = set(profiled.threads)
+
+    with request_scope(profiled):
+        me = threading.get_ident()
+        assert profiled.threads == {me}
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(node,))
+        worker.start()
+        worker.join()
+    assert seen["during"] == {me, worker.ident}
+    assert seen["after"] == {me}
+    # Nothing is attributed to the request once its scope is over
+    assert profiled.threads == set()
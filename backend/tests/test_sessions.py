@@ -0,0 +1,114 @@
+from sessions import SessionStore
+
+
+def test_history_over_budget_is_summarized() -> None:
+    store = SessionStore(
+        max_sessions=10,
+        ttl_seconds=60,
+        max_bytes=10_000,
+        history_tokens=20,
+    )
+    session = store.get("a")
+
+    assert not store.record(session, "what is a laplace transform?", "x" * 40, None)
+    assert store.record(session, "and its inverse?", "y" * 40, None)
+    store.summarize(session, lambda summary, turns: "laplace")
+
+    assert session.summary == "laplace"
+    assert list(session.turns) == [("and its inverse?", "y" * 40)]
+    assert store.stats()["summarized"] == 1
+
+
+def test_least_recently_used_session_is_evicted() -> None:
+    store = SessionStore(
+        max_sessions=2,
+        ttl_seconds=60,
+        max_bytes=10_000,
+        history_tokens=1000,
+    )
+    first = store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+
+    assert store.get("a") is first
+    assert store.stats()["evicted"] == 1
+    assert store.stats()["created"] == 3
+
+
+def test_expired_session_starts_over() -> None:
+    store = SessionStore(
+        max_sessions=10,
+        ttl_seconds=0,
+        max_bytes=10_000,
+        history_tokens=1000,
+    )
+    session = store.get("a")
+    store.record(session, "question", "answer", None)
+
+    assert not store.get("a").has_history()
+
+
+def test_session_without_id_gets_a_new_one() -> None:
+    store = SessionStore(
+        max_sessions=10,
+        ttl_seconds=60,
+        max_bytes=10_000,
+        history_tokens=1000,
+    )
+    first = store.get(None)
+    second = store.get(None)
+
+    assert first.id != second.id
+    assert store.get(first.id) is first
+    assert store.stats()["created"] == 2
+
+
+def test_failed_summary_keeps_the_turns() -> None:
+    store = SessionStore(
+        max_sessions=10,
+        ttl_seconds=60,
+        max_bytes=10_000,
+        history_tokens=20,
+    )
+    session = store.get("a")
+    store.record(session, "what is a laplace transform?", "x" * 40, None)
+    store.record(session, "and its inverse?", "y" * 40, None)
+
+    def broken(summary, turns):
+        raise ConnectionError("summarizer is down")
+
+    store.summarize(session, broken)
+
+    assert session.summary == ""
+    assert len(session.turns) == 2
+    assert not session.summarizing
+    assert store.stats()["summarize_failed"] == 1
+
+    # The next summary folds the turns the failed one left behind
+    store.record(session, "and for a step?", "z" * 40, None)
+    store.summarize(session, lambda summary, turns: f"{turns.count('User:')} turns")
+    assert session.summary == "2 turns"
+    assert list(session.turns) == [("and for a step?", "z" * 40)]
+
+
+def test_turns_recorded_while_summarizing_are_kept() -> None:
+    store = SessionStore(
+        max_sessions=10,
+        ttl_seconds=60,
+        max_bytes=10_000,
+        history_tokens=20,
+    )
+    session = store.get("a")
+    store.record(session, "first", "x" * 40, None)
+    store.record(session, "second", "y" * 40, None)
+
+    def summarize(summary, turns):
+        # A new turn finishes while the summary is being made
+        store.record(session, "third", "z" * 40, None)
+        return "first"
+
+    store.summarize(session, summarize)
+
+    assert session.summary == "first"
+    assert [q for q, _ in session.turns] == ["second", "third"]
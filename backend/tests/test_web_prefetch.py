@@ -0,0 +1,155 @@
+import threading
+import time
+
+import pytest
+
+from graph import web_prefetch
+from graph.request_context import DeadlineExceeded, RequestContext, request_scope
+from graph.web_prefetch import WebSearchPrefetcher
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    calls = []
+
+    def search(source):
+        def run(question):
+            calls.append(source)
+            return f"{source}: {question}"
+
+        return run
+
+    monkeypatch.setattr(
+        web_prefetch,
+        "SEARCHES",
+        {"tavily": search("tavily"), "wikipedia": search("wikipedia")},
+    )
+    return calls
+
+
+def test_only_weak_retrieval_triggers_a_prefetch(searches) -> None:
+    prefetcher = WebSearchPrefetcher(
+        enabled=True,
+        min_score=0.8,
+        min_results=2,
+        searches_per_minute=60,
+    )
+    assert prefetcher.is_weak([])
+    assert prefetcher.is_weak([0.95])
+    assert prefetcher.is_weak([0.5, 0.6])
+    assert not prefetcher.is_weak([0.9, 0.6])
+
+    # Nothing is started outside a request or when disabled
+    assert not prefetcher.maybe_start("question", [0.1])
+    with request_scope(RequestContext()):
+        disabled = WebSearchPrefetcher(
+            enabled=False,
+            min_score=0.8,
+            min_results=2,
+            searches_per_minute=60,
+        )
+        assert not disabled.maybe_start("question", [0.1])
+        assert not prefetcher.maybe_start("question", [0.9, 0.9])
+    assert prefetcher.stats()["started"] == 0
+
+
+def test_speculative_searches_are_capped(searches) -> None:
+    prefetcher = WebSearchPrefetcher(
+        enabled=True,
+        min_score=0.8,
+        min_results=2,
+        searches_per_minute=2,
+    )
+    with request_scope(RequestContext()) as ctx:
+        assert prefetcher.maybe_start("first", [0.1])
+        assert not prefetcher.maybe_start("second", [0.1])
+        prefetcher.discard(ctx)
+
+    stats = prefetcher.stats()
+    assert stats["started"] == 2
+    assert stats["skipped_cost_cap"] == 1
+
+
+def test_used_and_unused_prefetches_are_counted(searches) -> None:
+    prefetcher = WebSearchPrefetcher(
+        enabled=True,
+        min_score=0.8,
+        min_results=2,
+        searches_per_minute=60,
+    )
+    with request_scope(RequestContext()) as ctx:
+        prefetcher.maybe_start("question", [0.1])
+        assert prefetcher.search("tavily", "question") == "tavily: question"
+        prefetcher.discard(ctx)
+        assert ctx.prefetched == {}
+
+    stats = prefetcher.stats()
+    assert stats["hits"] == 1
+    assert stats["wasted"] == 1
+    assert stats["hit_rate"] == 0.5
+    # Tavily was searched once, by the prefetch, not again by search()
+    assert searches.count("tavily") == 1
+
+
+def test_prefetch_for_another_question_is_wasted(searches) -> None:
+    prefetcher = WebSearchPrefetcher(
+        enabled=True,
+        min_score=0.8,
+        min_results=2,
+        searches_per_minute=60,
+    )
+    with request_scope(RequestContext()) as ctx:
+        prefetcher.maybe_start("question", [0.1])
+        assert prefetcher.search("tavily", "other") == "tavily: other"
+        prefetcher.discard(ctx)
+
+    assert prefetcher.stats()["hits"] == 0
+    assert prefetcher.stats()["wasted"] == 2
+
+
+def test_slow_prefetch_stops_at_the_deadline(monkeypatch) -> None:
+    release = threading.Event()
+    calls = []
+
+    def slow(question):
+        calls.append(question)
+        release.wait(5)
+        return "late"
+
+    monkeypatch.setattr(web_prefetch, "SEARCHES", {"tavily": slow})
+    prefetcher = WebSearchPrefetcher(
+        enabled=True,
+        min_score=0.8,
+        min_results=2,
+        searches_per_minute=60,
+    )
+    with request_scope(RequestContext(deadline=time.monotonic() + 0.1)):
+        prefetcher.maybe_start("question", [0.1])
+        with pytest.raises(DeadlineExceeded):
+            prefetcher.search("tavily", "question")
+    release.set()
+
+    stats = prefetcher.stats()
+    assert stats["timed_out"] == 1
+    assert stats["failed"] == 0
+    # No synchronous search was started after the deadline
+    assert calls == ["question"]
+
+
+def test_failed_prefetch_falls_back_to_searching(monkeypatch) -> None:
+    def broken(question):
+        raise ConnectionError("search is down")
+
+    prefetcher = WebSearchPrefetcher(
+        enabled=True,
+        min_score=0.8,
+        min_results=2,
+        searches_per_minute=60,
+    )
+    with request_scope(RequestContext()):
+        monkeypatch.setattr(web_prefetch, "SEARCHES", {"tavily": broken})
+        prefetcher.maybe_start("question", [0.1])
+        monkeypatch.setattr(web_prefetch, "SEARCHES", {"tavily": lambda q: "fresh"})
+        assert prefetcher.search("tavily", "question") == "fresh"
+
+    assert prefetcher.stats()["failed"] == 1
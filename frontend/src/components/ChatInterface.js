@@ -8,6 +8,9 @@ export default function ChatInterface() {
   const [answer, setAnswer] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  // Lets the backend treat follow-up questions as part of one conversation;
+  // the backend assigns the id on the first question
+  const [sessionId, setSessionId] = useState(null);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -17,7 +20,8 @@ export default function ChatInterface() {
       setLoading(true);
       setError(null);
       setAnswer('Thinking...');  // Show thinking state immediately
-      const data = await api.sendQuestion(question);
+      const data = await api.sendQuestion(question, sessionId);
+      setSessionId(data.session_id);
       setAnswer(data.answer);
     } catch (error) {
       setError(error.message);
@@ -56,7 +56,7 @@ export const api = {
     }
   },
 
-  async sendQuestion(question) {
+  async sendQuestion(question, sessionId) {
     try {
       console.log('Sending question:', question);
       const response = await fetch(`${API_URL}/chat`, {
@@ -64,7 +64,7 @@ export const api = {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ question }),
+        body: JSON.stringify({ question, session_id: sessionId }),
       });
 
       if (!response.ok) {